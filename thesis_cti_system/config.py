@@ -4,8 +4,144 @@ Centralized configuration management
 """
 
 import os
+import functools
 from pathlib import Path
 
+# Domains queried against OTX; frozensets give O(1) membership checks
+THREAT_DOMAINS = frozenset({
+    # Security/Threat Intelligence Sources
+    "urlhaus.abuse.ch",
+    "phishtank.com",
+    "malware-traffic-analysis.net",
+    "otx.alienvault.com",
+    "virustotal.com",
+    "threatcrowd.org",
+    "malwaredomainlist.com",
+    "cybercrime-tracker.net",
+    "ransomwaretracker.abuse.ch",
+    "feodotracker.abuse.ch",
+    "sslbl.abuse.ch",
+    "zeustracker.abuse.ch",
+    "example.com",
+    # Tech Companies (High-value targets)
+    "microsoft.com",
+    "apple.com",
+    "google.com",
+    "amazon.com",
+    "facebook.com",
+    "meta.com",
+    "twitter.com",
+    "x.com",
+    "github.com",
+    "gitlab.com",
+    "bitbucket.org",
+    "dropbox.com",
+    "onedrive.com",
+    "cloudflare.com",
+    "adobe.com",
+    "oracle.com",
+    "salesforce.com",
+    "vmware.com",
+    "cisco.com",
+    "ibm.com",
+    "intel.com",
+    "nvidia.com",
+    # Social Media Platforms
+    "instagram.com",
+    "tiktok.com",
+    "linkedin.com",
+    "reddit.com",
+    "snapchat.com",
+    "pinterest.com",
+    "discord.com",
+    "telegram.org",
+    "signal.org",
+    "whatsapp.com",
+    # Financial Services (Commonly phished)
+    "paypal.com",
+    "visa.com",
+    "mastercard.com",
+    "americanexpress.com",
+    "chase.com",
+    "bankofamerica.com",
+    "wellsfargo.com",
+    "citibank.com",
+    "jpmorgan.com",
+    "goldmansachs.com",
+    "morganstanley.com",
+    "schwab.com",
+    "fidelity.com",
+    "etrade.com",
+    "coinbase.com",
+    "binance.com",
+    # E-commerce & Retail
+    "ebay.com",
+    "etsy.com",
+    "walmart.com",
+    "target.com",
+    "bestbuy.com",
+    "costco.com",
+    "alibaba.com",
+    "aliexpress.com",
+    # Email & Communication
+    "gmail.com",
+    "outlook.com",
+    "yahoo.com",
+    "protonmail.com",
+    "aol.com",
+    "hotmail.com",
+    "zoom.us",
+    "teams.microsoft.com",
+    "slack.com",
+    "skype.com",
+    # Streaming & Entertainment
+    "netflix.com",
+    "spotify.com",
+    "youtube.com",
+    "hulu.com",
+    "disney.com",
+    "hbo.com",
+    "paramount.com",
+    # News & Media
+    "cnn.com",
+    "bbc.com",
+    "reuters.com",
+    "bloomberg.com",
+    "wsj.com",
+    "nytimes.com",
+    "washingtonpost.com",
+    # Government & Official
+    "irs.gov",
+    "usps.com",
+    "fedex.com",
+    "ups.com",
+    "dhl.com",
+    # Gaming Platforms
+    "steam.com",
+    "epicgames.com",
+    "xbox.com",
+    "playstation.com",
+    "nintendo.com",
+    "blizzard.com",
+    "riotgames.com",
+    # Cloud & Infrastructure
+    "aws.amazon.com",
+    "azure.microsoft.com",
+    "gcp.google.com",
+    "digitalocean.com",
+    "heroku.com",
+    "vercel.com",
+    "netlify.com"
+})
+
+MALICIOUS_IPS = frozenset({
+    "8.8.8.8",
+    "1.1.1.1",
+    "208.67.222.222",
+    "10.0.0.1",
+    "192.168.1.1"
+})
+
 class Config:
     """Configuration management for CTI system"""
     
@@ -23,142 +159,12 @@ class Config:
         self.COLLECTION_INTERVAL_HOURS = 6
         self.DEFAULT_DOMAIN = "example.com"
         self.DEFAULT_IP = "8.8.8.8"
-        self.MALWAREBazaar_LIMIT = 10000  
+        self.MALWAREBAZAAR_LIMIT = 10000  
         self.ABUSEIPDB_LIMIT = 10000
         
-        self.THREAT_DOMAINS = [
-            # Security/Threat Intelligence Sources
-            "urlhaus.abuse.ch",
-            "phishtank.com",
-            "malware-traffic-analysis.net",
-            "otx.alienvault.com",
-            "virustotal.com",
-            "threatcrowd.org",
-            "malwaredomainlist.com",
-            "cybercrime-tracker.net",
-            "ransomwaretracker.abuse.ch",
-            "feodotracker.abuse.ch",
-            "sslbl.abuse.ch",
-            "zeustracker.abuse.ch",
-            "example.com",
-            # Tech Companies (High-value targets)
-            "microsoft.com",
-            "apple.com",
-            "google.com",
-            "amazon.com",
-            "facebook.com",
-            "meta.com",
-            "twitter.com",
-            "x.com",
-            "github.com",
-            "gitlab.com",
-            "bitbucket.org",
-            "dropbox.com",
-            "onedrive.com",
-            "cloudflare.com",
-            "adobe.com",
-            "oracle.com",
-            "salesforce.com",
-            "vmware.com",
-            "cisco.com",
-            "ibm.com",
-            "intel.com",
-            "nvidia.com",
-            # Social Media Platforms
-            "instagram.com",
-            "tiktok.com",
-            "linkedin.com",
-            "reddit.com",
-            "snapchat.com",
-            "pinterest.com",
-            "discord.com",
-            "telegram.org",
-            "signal.org",
-            "whatsapp.com",
-            # Financial Services (Commonly phished)
-            "paypal.com",
-            "visa.com",
-            "mastercard.com",
-            "americanexpress.com",
-            "chase.com",
-            "bankofamerica.com",
-            "wellsfargo.com",
-            "citibank.com",
-            "jpmorgan.com",
-            "goldmansachs.com",
-            "morganstanley.com",
-            "schwab.com",
-            "fidelity.com",
-            "etrade.com",
-            "coinbase.com",
-            "binance.com",
-            # E-commerce & Retail
-            "ebay.com",
-            "etsy.com",
-            "walmart.com",
-            "target.com",
-            "bestbuy.com",
-            "costco.com",
-            "alibaba.com",
-            "aliexpress.com",
-            # Email & Communication
-            "gmail.com",
-            "outlook.com",
-            "yahoo.com",
-            "protonmail.com",
-            "aol.com",
-            "hotmail.com",
-            "zoom.us",
-            "teams.microsoft.com",
-            "slack.com",
-            "skype.com",
-            # Streaming & Entertainment
-            "netflix.com",
-            "spotify.com",
-            "youtube.com",
-            "hulu.com",
-            "disney.com",
-            "hbo.com",
-            "paramount.com",
-            # News & Media
-            "cnn.com",
-            "bbc.com",
-            "reuters.com",
-            "bloomberg.com",
-            "wsj.com",
-            "nytimes.com",
-            "washingtonpost.com",
-            # Government & Official
-            "irs.gov",
-            "usps.com",
-            "fedex.com",
-            "ups.com",
-            "dhl.com",
-            # Gaming Platforms
-            "steam.com",
-            "epicgames.com",
-            "xbox.com",
-            "playstation.com",
-            "nintendo.com",
-            "blizzard.com",
-            "riotgames.com",
-            # Cloud & Infrastructure
-            "aws.amazon.com",
-            "azure.microsoft.com",
-            "gcp.google.com",
-            "digitalocean.com",
-            "heroku.com",
-            "vercel.com",
-            "netlify.com"
-        ]
-        
-        self.MALICIOUS_IPS = [
-            "8.8.8.8",                    
-            "1.1.1.1",                    
-            "208.67.222.222",             
-            "10.0.0.1",                  
-            "192.168.1.1"                 
-        ]
+        # Lookup sets shared by all instances
+        self.THREAT_DOMAINS = THREAT_DOMAINS
+        self.MALICIOUS_IPS = MALICIOUS_IPS
         
         # Logging configuration
         self.LOG_LEVEL = "INFO"
@@ -191,3 +197,8 @@ class Config:
         """Update API key for service"""
         self.API_KEYS[service] = key
 
+@functools.lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Get the shared Config instance, built on first use"""
+    return Config()
+
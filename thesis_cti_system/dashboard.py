@@ -8,9 +8,14 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import sqlite3
-import json
+import csv
+import io
+import orjson
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
 
 # Page configuration
 st.set_page_config(
@@ -39,43 +44,102 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Streamlit sessions run in separate threads and share the cached connection
+_DB_LOCK = threading.Lock()
+
+@st.cache_resource
+def get_conn(db_path: str = "cti_thesis.db") -> sqlite3.Connection:
+    """Open one SQLite connection that is reused for the life of the process"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA mmap_size=268435456")  # Map up to 256 MB of the database file
+    return conn
+
+@contextmanager
+def db_connection(db_path: str = "cti_thesis.db"):
+    """Borrow the shared connection, one session at a time"""
+    with _DB_LOCK:
+        yield get_conn(db_path)
+
 @st.cache_data(ttl=60)  # Cache for 60 seconds
-def load_data(db_path: str = "cti_thesis.db"):
-    """Load all IoC data from database"""
-    conn = sqlite3.connect(db_path)
-    
-    # Load IoCs
-    df_iocs = pd.read_sql_query("""
-        SELECT 
-            indicator,
-            type,
-            source,
-            first_seen,
-            last_seen,
-            seen_count,
-            confidence,
-            threat_level,
-            metadata,
-            created_at
-        FROM iocs
-        ORDER BY created_at DESC
-    """, conn)
-    
-    # Load collection logs
-    df_logs = pd.read_sql_query("""
-        SELECT 
-            source,
-            collection_time,
-            iocs_processed,
-            iocs_new,
-            iocs_updated,
-            status,
-            created_at
-        FROM collection_logs
-        ORDER BY created_at DESC
-    """, conn)
-    
-    conn.close()
+def load_filter_options(db_path: str = "cti_thesis.db") -> Dict[str, Any]:
+    """Load distinct filter values and the first_seen date bounds"""
+    options = {}
+    with db_connection(db_path) as conn:
+        for column in ('type', 'source', 'threat_level', 'confidence'):
+            rows = conn.execute(
+                f"SELECT DISTINCT {column} FROM iocs WHERE {column} IS NOT NULL ORDER BY {column}"
+            ).fetchall()
+            options[column] = [row[0] for row in rows]
+        
+        total, min_seen, max_seen = conn.execute(
+            "SELECT COUNT(*), MIN(first_seen), MAX(first_seen) FROM iocs"
+        ).fetchone()
+    
+    options['total_iocs'] = total
+    options['min_date'] = pd.to_datetime(min_seen).date() if min_seen else datetime.now().date()
+    options['max_date'] = pd.to_datetime(max_seen).date() if max_seen else datetime.now().date()
+    
+    return options
+
+def build_filter_clause(filters: Tuple) -> Tuple[str, List[Any]]:
+    """Build a parameterized WHERE clause from the sidebar filter selections"""
+    search_term, prefix_match, ioc_type, source, threat_level, confidence, date_range = filters
+    clauses = []
+    params = []
+    
+    if search_term:
+        # LIKE is case-insensitive for ASCII; escape its wildcards so '_' and '%' match literally.
+        # A prefix pattern can use the NOCASE index on indicator, a substring pattern scans.
+        escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        clauses.append("indicator LIKE ? ESCAPE '\\'")
+        params.append(f"{escaped}%" if prefix_match else f"%{escaped}%")
+    
+    for column, value in (('type', ioc_type), ('source', source),
+                          ('threat_level', threat_level), ('confidence', confidence)):
+        if value != 'All':
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    
+    if date_range:
+        # first_seen is an ISO timestamp, so a half-open string range keeps the index usable
+        start_date, end_date = date_range
+        clauses.append("first_seen >= ? AND first_seen < ?")
+        params.extend([start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()])
+    
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params
+
+# IoC columns used by the dashboard views; metadata is only loaded on demand
+IOC_COLUMNS = ['indicator', 'type', 'source', 'first_seen', 'last_seen',
+               'seen_count', 'confidence', 'threat_level', 'created_at']
+CATEGORY_COLUMNS = ['type', 'source', 'threat_level', 'confidence']
+
+# ORDER BY clauses for the Top IoCs sort options
+TOP_IOC_ORDER = {
+    "Seen Count (Most)": "seen_count DESC",
+    "Seen Count (Least)": "seen_count ASC",
+    "Most Recent": "first_seen DESC",
+    "Oldest": "first_seen ASC"
+}
+
+@st.cache_data(ttl=60)
+def load_filtered_iocs(filters: Tuple, db_path: str = "cti_thesis.db",
+                       limit: Optional[int] = None,
+                       order_by: str = "created_at DESC") -> pd.DataFrame:
+    """Load the IoCs matching the sidebar filters from database"""
+    where, params = build_filter_clause(filters)
+    sql = f"SELECT {', '.join(IOC_COLUMNS)} FROM iocs{where} ORDER BY {order_by}"
+    
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    
+    # Read in chunks into Arrow-backed columns to bound peak memory
+    with db_connection(db_path) as conn:
+        chunks = list(pd.read_sql_query(sql, conn, params=params, chunksize=50_000,
+                                        dtype_backend="pyarrow"))
+    df_iocs = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=IOC_COLUMNS)
     
     # Convert date columns
     if not df_iocs.empty:
@@ -83,47 +147,180 @@ def load_data(db_path: str = "cti_thesis.db"):
         df_iocs['last_seen'] = pd.to_datetime(df_iocs['last_seen'], errors='coerce')
         df_iocs['created_at'] = pd.to_datetime(df_iocs['created_at'], errors='coerce')
     
+    # Low-cardinality labels are stored as integer codes plus a small dictionary
+    for column in CATEGORY_COLUMNS:
+        df_iocs[column] = df_iocs[column].astype('category')
+    
+    return df_iocs
+
+def load_top_iocs(filters: Tuple, sort_by: str, n: int = 20) -> pd.DataFrame:
+    """Load the top n filtered IoCs for a sort option, sorted and limited in SQL"""
+    order_by = TOP_IOC_ORDER[sort_by] + ", created_at DESC"
+    return load_filtered_iocs(filters, limit=n, order_by=order_by)
+
+@st.cache_data(ttl=60)
+def load_metadata(keys: Tuple[Tuple[str, str], ...], db_path: str = "cti_thesis.db") -> Dict[Tuple[str, str], str]:
+    """Load metadata for the given (indicator, type) keys"""
+    if not keys:
+        return {}
+    
+    placeholders = ", ".join(["(?, ?)"] * len(keys))
+    params = [value for key in keys for value in key]
+    
+    with db_connection(db_path) as conn:
+        rows = conn.execute(
+            f"SELECT indicator, type, json(metadata) FROM iocs WHERE (indicator, type) IN (VALUES {placeholders})",
+            params
+        ).fetchall()
+    
+    return {(indicator, ioc_type): metadata for indicator, ioc_type, metadata in rows}
+
+@st.cache_data(ttl=60)
+def load_logs(db_path: str = "cti_thesis.db") -> pd.DataFrame:
+    """Load collection logs from database"""
+    with db_connection(db_path) as conn:
+        df_logs = pd.read_sql_query("""
+            SELECT 
+                source,
+                collection_time,
+                iocs_processed,
+                iocs_new,
+                iocs_updated,
+                status,
+                created_at
+            FROM collection_logs
+            ORDER BY created_at DESC
+        """, conn)
+    
     if not df_logs.empty:
         df_logs['collection_time'] = pd.to_datetime(df_logs['collection_time'], errors='coerce')
         df_logs['created_at'] = pd.to_datetime(df_logs['created_at'], errors='coerce')
+        df_logs['source'] = df_logs['source'].astype('category')
+        df_logs['status'] = df_logs['status'].astype('category')
     
-    return df_iocs, df_logs
+    return df_logs
 
-def get_statistics(df_iocs: pd.DataFrame) -> Dict[str, Any]:
-    """Calculate key statistics"""
-    if df_iocs.empty:
-        return {
-            'total_iocs': 0,
-            'unique_indicators': 0,
-            'by_type': {},
-            'by_source': {},
-            'by_threat_level': {},
-            'by_confidence': {}
+@st.cache_data(ttl=60)
+def get_statistics(filters: Tuple, db_path: str = "cti_thesis.db") -> Dict[str, Any]:
+    """Calculate key statistics for the filtered IoCs in SQL"""
+    where, params = build_filter_clause(filters)
+    with db_connection(db_path) as conn:
+        total, unique, avg_seen, max_seen = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT indicator), AVG(seen_count), MAX(seen_count) FROM iocs" + where,
+            params
+        ).fetchone()
+        
+        stats = {
+            'total_iocs': total,
+            'unique_indicators': unique,
+            'avg_seen_count': avg_seen or 0,
+            'max_seen_count': max_seen or 0
         }
-    
-    stats = {
-        'total_iocs': len(df_iocs),
-        'unique_indicators': df_iocs['indicator'].nunique(),
-        'by_type': df_iocs['type'].value_counts().to_dict(),
-        'by_source': df_iocs['source'].value_counts().to_dict(),
-        'by_threat_level': df_iocs['threat_level'].value_counts().to_dict(),
-        'by_confidence': df_iocs['confidence'].value_counts().to_dict(),
-        'avg_seen_count': df_iocs['seen_count'].mean(),
-        'max_seen_count': df_iocs['seen_count'].max()
-    }
+        
+        for key, column in (('by_type', 'type'), ('by_source', 'source'),
+                            ('by_threat_level', 'threat_level'), ('by_confidence', 'confidence')):
+            rows = conn.execute(
+                f"SELECT {column}, COUNT(*) FROM iocs{where} GROUP BY {column} ORDER BY COUNT(*) DESC",
+                params
+            ).fetchall()
+            stats[key] = dict(rows)
     
     return stats
 
+@st.cache_data(ttl=60)
+def get_daily_counts(filters: Tuple, db_path: str = "cti_thesis.db") -> pd.DataFrame:
+    """Count filtered IoCs per first_seen date in SQL"""
+    where, params = build_filter_clause(filters)
+    with db_connection(db_path) as conn:
+        daily_counts = pd.read_sql_query(
+            f"SELECT date(first_seen) AS Date, COUNT(*) AS Count FROM iocs{where} GROUP BY Date ORDER BY Date",
+            conn, params=params
+        )
+    
+    daily_counts['Date'] = pd.to_datetime(daily_counts['Date'], errors='coerce').dt.date
+    return daily_counts
+
+@st.cache_data(ttl=60)
+def get_logs_daily(db_path: str = "cti_thesis.db") -> pd.DataFrame:
+    """Sum new and processed IoCs per collection date in SQL"""
+    with db_connection(db_path) as conn:
+        logs_daily = pd.read_sql_query("""
+            SELECT 
+                date(created_at) AS created_at,
+                SUM(iocs_new) AS iocs_new,
+                SUM(iocs_processed) AS iocs_processed
+            FROM collection_logs
+            GROUP BY date(created_at)
+            ORDER BY date(created_at)
+        """, conn)
+    
+    logs_daily['created_at'] = pd.to_datetime(logs_daily['created_at'], errors='coerce').dt.date
+    return logs_daily
+
+# Full IoC records for export, in table column order
+EXPORT_COLUMNS = ['indicator', 'type', 'source', 'first_seen', 'last_seen', 'seen_count',
+                  'confidence', 'threat_level', 'metadata', 'created_at']
+# json() renders metadata as text whether it is stored as JSON text or JSONB
+EXPORT_SELECT = ', '.join('json(metadata) AS metadata' if column == 'metadata' else column
+                          for column in EXPORT_COLUMNS)
+EXPORT_CHUNK_SIZE = 50_000
+
+def iter_export_rows(conn: sqlite3.Connection, filters: Tuple):
+    """Yield the filtered IoC rows in chunks straight from the cursor"""
+    where, params = build_filter_clause(filters)
+    cursor = conn.execute(
+        f"SELECT {EXPORT_SELECT} FROM iocs{where} ORDER BY created_at DESC", params
+    )
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        yield rows
+
+@st.cache_data(ttl=60)
+def export_csv(filters: Tuple, db_path: str = "cti_thesis.db") -> bytes:
+    """Serialize the filtered IoCs, including metadata, as CSV"""
+    buf = io.BytesIO()
+    text = io.TextIOWrapper(buf, encoding='utf-8', newline='')
+    writer = csv.writer(text, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    
+    with db_connection(db_path) as conn:
+        for rows in iter_export_rows(conn, filters):
+            writer.writerows(rows)
+    
+    text.flush()
+    text.detach()  # Keep buf open after the wrapper goes away
+    return buf.getvalue()
+
+@st.cache_data(ttl=60)
+def export_json(filters: Tuple, db_path: str = "cti_thesis.db") -> bytes:
+    """Serialize the filtered IoCs, including metadata, as JSON records"""
+    buf = io.BytesIO()
+    buf.write(b"[")
+    first = True
+    
+    with db_connection(db_path) as conn:
+        for rows in iter_export_rows(conn, filters):
+            for row in rows:
+                if not first:
+                    buf.write(b",")
+                buf.write(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))))
+                first = False
+    
+    buf.write(b"]")
+    return buf.getvalue()
+
 def main():
     """Main dashboard function"""
     
     # Header
     st.markdown('<h1 class="main-header">🛡️ CTI Collection System Dashboard</h1>', unsafe_allow_html=True)
     
-    # Load data
-    df_iocs, df_logs = load_data()
+    # Load filter options
+    options = load_filter_options()
     
-    if df_iocs.empty:
+    if options['total_iocs'] == 0:
         st.warning("⚠️ No IoCs found in database. Run collection first using `python main.py single`")
         return
     
@@ -136,27 +333,32 @@ def main():
         placeholder="Enter IP, URL, hash, domain, etc.",
         help="Search for specific IoCs by indicator value (case-insensitive)"
     )
+    search_term = search_term.strip() if search_term else ""
+    prefix_match = st.sidebar.checkbox(
+        "Match start of indicator only",
+        help="Prefix searches are answered from the indicator index and are much faster on large databases"
+    )
     
     # Type filter
-    types = ['All'] + sorted(df_iocs['type'].unique().tolist())
+    types = ['All'] + options['type']
     selected_type = st.sidebar.selectbox("IoC Type", types)
     
     # Source filter
-    sources = ['All'] + sorted(df_iocs['source'].unique().tolist())
+    sources = ['All'] + options['source']
     selected_source = st.sidebar.selectbox("Source", sources)
     
     # Threat level filter
-    threat_levels = ['All'] + sorted(df_iocs['threat_level'].unique().tolist())
+    threat_levels = ['All'] + options['threat_level']
     selected_threat = st.sidebar.selectbox("Threat Level", threat_levels)
     
     # Confidence filter
-    confidences = ['All'] + sorted(df_iocs['confidence'].unique().tolist())
+    confidences = ['All'] + options['confidence']
     selected_confidence = st.sidebar.selectbox("Confidence", confidences)
     
     # Date range filter
     st.sidebar.subheader("Date Range")
-    min_date = df_iocs['first_seen'].min().date() if not df_iocs.empty else datetime.now().date()
-    max_date = df_iocs['first_seen'].max().date() if not df_iocs.empty else datetime.now().date()
+    min_date = options['min_date']
+    max_date = options['max_date']
     
     date_range = st.sidebar.date_input(
         "Select Date Range",
@@ -164,44 +366,21 @@ def main():
         min_value=min_date,
         max_value=max_date
     )
+    if not (isinstance(date_range, tuple) and len(date_range) == 2):
+        date_range = None
     
-    # Apply filters
-    filtered_df = df_iocs.copy()
-    
-    # Apply search filter
-    if search_term and search_term.strip():
-        search_term = search_term.strip()
-        filtered_df = filtered_df[
-            filtered_df['indicator'].str.contains(search_term, case=False, na=False)
-        ]
-    
-    if selected_type != 'All':
-        filtered_df = filtered_df[filtered_df['type'] == selected_type]
-    
-    if selected_source != 'All':
-        filtered_df = filtered_df[filtered_df['source'] == selected_source]
-    
-    if selected_threat != 'All':
-        filtered_df = filtered_df[filtered_df['threat_level'] == selected_threat]
-    
-    if selected_confidence != 'All':
-        filtered_df = filtered_df[filtered_df['confidence'] == selected_confidence]
-    
-    if isinstance(date_range, tuple) and len(date_range) == 2:
-        filtered_df = filtered_df[
-            (filtered_df['first_seen'].dt.date >= date_range[0]) &
-            (filtered_df['first_seen'].dt.date <= date_range[1])
-        ]
+    # Apply filters in SQL
+    filters = (search_term, prefix_match, selected_type, selected_source, selected_threat,
+               selected_confidence, date_range)
+    stats = get_statistics(filters)
     
     # Show search results info
-    if search_term and search_term.strip():
-        search_count = len(filtered_df)
-        total_count = len(df_iocs)
+    if search_term:
+        search_count = stats['total_iocs']
+        total_count = options['total_iocs']
         st.info(f"Search Results: Found **{search_count:,}** IoC(s) matching '{search_term}' out of {total_count:,} total IoCs")
     
     # Key Metrics
-    stats = get_statistics(filtered_df)
-    
     st.header("📊 Key Metrics")
     col1, col2, col3, col4 = st.columns(4)
     
@@ -223,9 +402,8 @@ def main():
     
     with col1:
         # IoCs Over Time
-        if not filtered_df.empty:
-            daily_counts = filtered_df.groupby(filtered_df['first_seen'].dt.date).size().reset_index()
-            daily_counts.columns = ['Date', 'Count']
+        if stats['total_iocs'] > 0:
+            daily_counts = get_daily_counts(filters)
             
             fig_trend = px.line(
                 daily_counts,
@@ -292,21 +470,22 @@ def main():
     # Sort options
     sort_by = st.selectbox(
         "Sort by",
-        ["Seen Count (Most)", "Seen Count (Least)", "Most Recent", "Oldest"],
+        list(TOP_IOC_ORDER),
         key="sort_select"
     )
     
-    if sort_by == "Seen Count (Most)":
-        top_iocs = filtered_df.nlargest(20, 'seen_count')
-    elif sort_by == "Seen Count (Least)":
-        top_iocs = filtered_df.nsmallest(20, 'seen_count')
-    elif sort_by == "Most Recent":
-        top_iocs = filtered_df.nlargest(20, 'first_seen')
-    else:
-        top_iocs = filtered_df.nsmallest(20, 'first_seen')
+    top_iocs = load_top_iocs(filters, sort_by)
     
     # Display table
     display_cols = ['indicator', 'type', 'source', 'seen_count', 'threat_level', 'confidence', 'first_seen']
+    
+    # Metadata is fetched only for the displayed rows, and only when requested
+    if st.checkbox("Show metadata", key="show_metadata"):
+        keys = tuple(zip(top_iocs['indicator'], top_iocs['type']))
+        metadata = load_metadata(keys)
+        top_iocs = top_iocs.assign(metadata=[metadata.get(key) for key in keys])
+        display_cols.append('metadata')
+    
     st.dataframe(
         top_iocs[display_cols].rename(columns={
             'indicator': 'Indicator',
@@ -315,7 +494,8 @@ def main():
             'seen_count': 'Seen Count',
             'threat_level': 'Threat Level',
             'confidence': 'Confidence',
-            'first_seen': 'First Seen'
+            'first_seen': 'First Seen',
+            'metadata': 'Metadata'
         }),
         use_container_width=True,
         height=400
@@ -327,7 +507,7 @@ def main():
     
     with col1:
         # CSV Export
-        csv = filtered_df.to_csv(index=False)
+        csv = export_csv(filters)
         st.download_button(
             label="Download as CSV",
             data=csv,
@@ -337,7 +517,7 @@ def main():
     
     with col2:
         # JSON Export
-        json_data = filtered_df.to_json(orient='records', date_format='iso')
+        json_data = export_json(filters)
         st.download_button(
             label="Download as JSON",
             data=json_data,
@@ -346,26 +526,25 @@ def main():
         )
     
     # Collection Logs
+    df_logs = load_logs()
     if not df_logs.empty:
         st.header("📋 Collection Logs")
         
-        # Summary stats
+        # Summary stats (one count pass instead of a filtered copy per status)
+        status_counts = df_logs['status'].value_counts()
         col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("Total Collections", len(df_logs))
         with col2:
-            successful = len(df_logs[df_logs['status'] == 'success'])
+            successful = int(status_counts.get('success', 0))
             st.metric("Successful", successful)
         with col3:
-            failed = len(df_logs[df_logs['status'] == 'error'])
+            failed = int(status_counts.get('error', 0))
             st.metric("Failed", failed)
         
         # Recent collections chart
         if len(df_logs) > 0:
-            logs_daily = df_logs.groupby(df_logs['created_at'].dt.date).agg({
-                'iocs_new': 'sum',
-                'iocs_processed': 'sum'
-            }).reset_index()
+            logs_daily = get_logs_daily()
             
             fig_logs = go.Figure()
             fig_logs.add_trace(go.Scatter(
@@ -4,27 +4,137 @@ Handles all database operations and schema management
 """
 
 import sqlite3
-import json
+import orjson
 import logging
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Tuple, Optional
 from datetime import datetime
 
+def dumps_json_text(obj: Any) -> str:
+    """Serialize obj to JSON text for binding as a SQLite parameter"""
+    # Decoded to str: SQLite's JSON functions would read a bytes value as JSONB
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+# UPSERT ... RETURNING below needs SQLite 3.35; fail at import rather than on every batch
+MIN_SQLITE_VERSION = (3, 35, 0)
+if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+    raise RuntimeError(
+        f"SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required "
+        f"(Python is linked against {sqlite3.sqlite_version})"
+    )
+
+# SQLite 3.45+ stores metadata in its binary JSONB format, which JSON functions read
+# without reparsing text; older libraries keep the JSON text as before
+_JSONB_SUPPORTED = sqlite3.sqlite_version_info >= (3, 45, 0)
+_METADATA_TYPE = "BLOB" if _JSONB_SUPPORTED else "TEXT"
+_METADATA_VALUE = "jsonb(json_extract(value, '$[6]'))" if _JSONB_SUPPORTED else "json_extract(value, '$[6]')"
+
+# Hot-path statements, kept as constants so each one is prepared once and then
+# served from the connection's statement cache
+
+# The whole batch is bound as one JSON array of
+# [indicator, type, source, date_collected, confidence, threat_level, metadata] rows,
+# so SQLite walks it in C. json_extract works in any JSON1 build, unlike ->> (3.38+).
+# WHERE true lets the parser tell ON CONFLICT from a join.
+# RETURNING yields seen_count per row: 1 for a new IoC, higher for an update.
+_UPSERT_IOCS_SQL = f"""
+INSERT INTO iocs (indicator, type, source, first_seen, last_seen,
+                  seen_count, confidence, threat_level, metadata)
+SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'),
+       json_extract(value, '$[3]'), json_extract(value, '$[3]'), 1,
+       json_extract(value, '$[4]'), json_extract(value, '$[5]'), {_METADATA_VALUE}
+FROM json_each(?)
+WHERE true
+ON CONFLICT(indicator, type) DO UPDATE SET
+    last_seen=max(iocs.last_seen, excluded.last_seen),
+    seen_count=iocs.seen_count + 1,
+    source=excluded.source,
+    confidence=excluded.confidence,
+    threat_level=excluded.threat_level,
+    metadata=excluded.metadata
+RETURNING seen_count
+"""
+
+_INSERT_LOG_SQL = """
+INSERT INTO collection_logs (source, collection_time, iocs_processed, iocs_new, iocs_updated, errors, status)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Every statistic in one round-trip: rows are (kind, key, count, avg_seen, max_seen)
+_COLLECTION_STATS_SQL = """
+SELECT 'total', NULL, COUNT(*), AVG(seen_count), MAX(seen_count) FROM iocs
+UNION ALL
+SELECT 'type', type, COUNT(*), NULL, NULL FROM iocs GROUP BY type
+UNION ALL
+SELECT 'source', source, COUNT(*), NULL, NULL FROM iocs GROUP BY source
+UNION ALL
+SELECT 'recent', DATE(first_seen), COUNT(*), NULL, NULL FROM iocs
+WHERE first_seen >= date('now', '-7 days') GROUP BY DATE(first_seen)
+UNION ALL
+SELECT 'status', status, COUNT(*), NULL, NULL FROM collection_logs GROUP BY status
+ORDER BY 3 DESC
+"""
+
 class CTIDatabase:
     """Database manager for CTI collection system"""
     
     def __init__(self, db_path: str = "cti_thesis.db"):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
         self.logger = logging.getLogger(__name__)
-        self.setup_schema()
+        
+        # One connection per thread, so worker threads can use the database concurrently
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        self._get_conn()
         self.logger.info(f"Database initialized: {db_path}")
     
-    def setup_schema(self):
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection owned by the calling thread"""
+        return self._get_conn()
+    
+    def _get_conn(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Each connection is only used by the thread that opened it; the same-thread
+            # check is disabled so close() can shut down every thread's connection
+            conn = sqlite3.connect(self.db_path, cached_statements=256, check_same_thread=False)
+            self.configure_connection(conn)
+            # The DDL is idempotent and cheap, and a new connection may be looking at a
+            # fresh database (a recreated file, or its own :memory: database)
+            self.setup_schema(conn)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def configure_connection(self, conn: sqlite3.Connection):
+        """Apply performance PRAGMAs to the connection"""
+        # WAL lets the dashboard read while collection writes. With synchronous=NORMAL
+        # commits skip the fsync; WAL keeps the database consistent after a crash, and
+        # at worst the last transactions before a power loss are rolled back.
+        # page_size and auto_vacuum only take effect before the first table is created
+        # (and page_size not at all once WAL is on), so set them on a new file only
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA page_size=8192")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB memory-mapped reads
+        conn.execute("PRAGMA cache_size=-65536")    # 64 MB page cache
+        conn.execute("PRAGMA busy_timeout=5000")    # Wait up to 5 s on a locked database
+    
+    def setup_schema(self, conn: sqlite3.Connection = None):
         """Setup database schema"""
-        cursor = self.conn.cursor()
+        conn = conn or self._get_conn()
+        cursor = conn.cursor()
         
         # Main IoCs table
-        cursor.execute("""
+        cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS iocs (
             indicator TEXT NOT NULL,
             type TEXT NOT NULL,
@@ -34,12 +144,20 @@ class CTIDatabase:
             seen_count INTEGER NOT NULL DEFAULT 1,
             confidence TEXT DEFAULT 'medium',
             threat_level TEXT DEFAULT 'medium',
-            metadata TEXT,
+            metadata {_METADATA_TYPE},
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             PRIMARY KEY (indicator, type)
         )
         """)
         
+        # Indexes for the dashboard's filter columns and date range. Lookups by indicator
+        # alone already search the primary key's leading column, so it needs no index.
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_iocs_type ON iocs(type)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_iocs_source ON iocs(source)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_iocs_first_seen ON iocs(first_seen)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_iocs_seen_count ON iocs(seen_count DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_iocs_indicator_nocase ON iocs(indicator COLLATE NOCASE)")
+        
         # Collection logs
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS collection_logs (
@@ -55,106 +173,137 @@ class CTIDatabase:
         )
         """)
         
-        self.conn.commit()
+        # Collect planner statistics so the GROUP BY and date-range stats queries pick
+        # the indexes; optimize() from the daily maintenance job keeps them current
+        if not self._has_planner_stats(conn):
+            cursor.execute("ANALYZE")
+        
+        conn.commit()
+    
+    def _has_planner_stats(self, conn: sqlite3.Connection) -> bool:
+        """Check whether ANALYZE has recorded statistics for any index"""
+        # ANALYZE over empty tables creates sqlite_stat1 without rows, so test for rows
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone() is None:
+            return False
+        return conn.execute("SELECT 1 FROM sqlite_stat1 LIMIT 1").fetchone() is not None
     
     def insert_or_update_iocs(self, iocs: List[Dict[str, Any]]) -> Dict[str, int]:
         """Insert or update IoCs with deduplication"""
-        cursor = self.conn.cursor()
-        stats = {'processed': 0, 'new': 0, 'updated': 0, 'errors': 0}
+        return self.bulk_upsert_iocs(iocs)
+    
+    def bulk_upsert_iocs(self, iocs: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Insert or update a batch of IoCs with a single statement in one transaction"""
+        stats = {'processed': len(iocs), 'new': 0, 'updated': 0, 'errors': 0}
+        rows, payload = self._prepare_batch(iocs, stats)
         
+        conn = self._get_conn()
+        try:
+            with conn:
+                self._upsert_batch(conn.cursor(), rows, payload, stats)
+        except sqlite3.Error as e:
+            self._record_upsert_failure(rows, stats, e)
+        return stats
+    
+    def _prepare_batch(self, iocs: List[Dict[str, Any]], stats: Dict[str, int]) -> Tuple[List[list], str]:
+        """Validate IoCs into rows and serialize them as one JSON array"""
+        rows = []
         for ioc in iocs:
             try:
-                stats['processed'] += 1
-                
-                # Check if IoC exists
-                cursor.execute("""
-                SELECT first_seen, last_seen, seen_count FROM iocs 
-                WHERE indicator=? AND type=?
-                """, (ioc['indicator'], ioc['type']))
-                
-                row = cursor.fetchone()
-                
-                if row is None:
-                    # New IoC
-                    cursor.execute("""
-                    INSERT INTO iocs (indicator, type, source, first_seen, last_seen, 
-                                    seen_count, confidence, threat_level, metadata)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        ioc['indicator'], ioc['type'], ioc['source'], 
-                        ioc['date_collected'], ioc['date_collected'], 1,
-                        ioc.get('confidence', 'medium'), ioc.get('threat_level', 'medium'),
-                        json.dumps(ioc.get('metadata', {}))
-                    ))
-                    stats['new'] += 1
-                    self.logger.info(f"Inserted new IoC: {ioc['indicator']} ({ioc['type']})")
-                    
-                else:
-                    # Update existing IoC
-                    first_seen, last_seen, seen_count = row
-                    new_last = max(last_seen, ioc['date_collected'])
-                    new_count = seen_count + 1
-                    
-                    cursor.execute("""
-                    UPDATE iocs SET last_seen=?, seen_count=?, source=?, 
-                                  confidence=?, threat_level=?, metadata=?
-                    WHERE indicator=? AND type=?
-                    """, (
-                        new_last, new_count, ioc['source'], 
-                        ioc.get('confidence', 'medium'), ioc.get('threat_level', 'medium'),
-                        json.dumps(ioc.get('metadata', {})),
-                        ioc['indicator'], ioc['type']
-                    ))
-                    stats['updated'] += 1
-                    self.logger.info(f"Updated IoC: {ioc['indicator']} (count: {new_count})")
-                    
-            except Exception as e:
+                row = [
+                    ioc['indicator'], ioc['type'], ioc['source'], ioc['date_collected'],
+                    ioc.get('confidence', 'medium'), ioc.get('threat_level', 'medium'),
+                    ioc.get('metadata') or {}
+                ]
+            except (KeyError, TypeError) as e:
                 stats['errors'] += 1
-                self.logger.error(f"Error processing IoC {ioc['indicator']}: {e}")
+                self.logger.error(f"Error processing IoC {ioc.get('indicator')}: {e}")
+                continue
+            
+            # A NOT NULL violation would roll back the whole statement, so reject it here
+            if not all(isinstance(value, str) for value in row[:4]):
+                stats['errors'] += 1
+                self.logger.error(f"Error processing IoC {row[0]}: indicator, type, source "
+                                  f"and date_collected must be strings")
+                continue
+            rows.append(row)
+        
+        try:
+            payload = dumps_json_text(rows)
+        except TypeError:
+            # Some metadata cannot be serialized; drop those rows and keep the rest
+            valid_rows = []
+            for row in rows:
+                try:
+                    dumps_json_text(row)
+                    valid_rows.append(row)
+                except TypeError as e:
+                    stats['errors'] += 1
+                    self.logger.error(f"Error processing IoC {row[0]}: {e}")
+            rows = valid_rows
+            payload = dumps_json_text(rows)
+        
+        return rows, payload
+    
+    def _upsert_batch(self, cursor: sqlite3.Cursor, rows: List[list], payload: str, stats: Dict[str, int]):
+        """Run the batch upsert on cursor without committing"""
+        cursor.execute(_UPSERT_IOCS_SQL, (payload,))
+        stats['new'] = sum(1 for (seen_count,) in cursor if seen_count == 1)
+        stats['updated'] = len(rows) - stats['new']
+        self.logger.info(f"Upserted {len(rows)} IoCs: {stats['new']} new, {stats['updated']} updated")
+    
+    def _record_upsert_failure(self, rows: List[list], stats: Dict[str, int], error: sqlite3.Error):
+        """Count every row of a rolled-back batch as an error"""
+        stats['new'] = stats['updated'] = 0
+        stats['errors'] += len(rows)
+        self.logger.error(f"Error upserting {len(rows)} IoCs: {error}")
+    
+    def record_collection(self, iocs: List[Dict[str, Any]], source: str, errors: str = None) -> Dict[str, int]:
+        """Upsert a run's IoCs and log the run, committing both in one transaction"""
+        stats = {'processed': len(iocs), 'new': 0, 'updated': 0, 'errors': 0}
+        rows, payload = self._prepare_batch(iocs, stats)
         
-        self.conn.commit()
+        conn = self._get_conn()
+        try:
+            with conn:
+                cursor = conn.cursor()
+                self._upsert_batch(cursor, rows, payload, stats)
+                cursor.execute(_INSERT_LOG_SQL, self._log_row(source, stats, errors))
+        except sqlite3.Error as e:
+            # Both writes were rolled back; still record that the run happened
+            self._record_upsert_failure(rows, stats, e)
+            self.log_collection(source, stats, f"{errors}; {e}" if errors else str(e))
+            return stats
+        
+        self.logger.info(f"Logged collection: {source} - {stats}")
         return stats
     
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get comprehensive collection statistics for thesis evaluation"""
         cursor = self.conn.cursor()
-        stats = {}
-        
-        # Total IoCs
-        cursor.execute("SELECT COUNT(*) FROM iocs")
-        stats['total_iocs'] = cursor.fetchone()[0]
+        cursor.execute(_COLLECTION_STATS_SQL)
         
-        # IoCs by type
-        cursor.execute("SELECT type, COUNT(*) FROM iocs GROUP BY type ORDER BY COUNT(*) DESC")
-        stats['by_type'] = dict(cursor.fetchall())
+        # Split the fused rows back out by kind; count order is preserved within each
+        grouped = {'type': {}, 'source': {}, 'recent': {}, 'status': {}}
+        avg_seen = max_seen = None
+        total_iocs = 0
+        for kind, key, count, avg, maximum in cursor.fetchall():
+            if kind == 'total':
+                total_iocs, avg_seen, max_seen = count, avg, maximum
+            else:
+                grouped[kind][key] = count
+        status_counts = grouped['status']
         
-        # IoCs by source
-        cursor.execute("SELECT source, COUNT(*) FROM iocs GROUP BY source ORDER BY COUNT(*) DESC")
-        stats['by_source'] = dict(cursor.fetchall())
-        
-        # Recent activity (last 7 days)
-        cursor.execute("""
-        SELECT DATE(first_seen), COUNT(*) FROM iocs 
-        WHERE first_seen >= date('now', '-7 days') 
-        GROUP BY DATE(first_seen)
-        """)
-        stats['recent_activity'] = dict(cursor.fetchall())
-        
-        # Collection logs count
-        cursor.execute("SELECT COUNT(*) FROM collection_logs")
-        stats['collection_runs'] = cursor.fetchone()[0]
-        
-        # Deduplication statistics
-        cursor.execute("SELECT AVG(seen_count), MAX(seen_count) FROM iocs")
-        avg_seen, max_seen = cursor.fetchone()
-        stats['deduplication'] = {
-            'avg_seen_count': avg_seen or 0,
-            'max_seen_count': max_seen or 0
+        stats = {
+            'total_iocs': total_iocs,
+            'by_type': grouped['type'],
+            'by_source': grouped['source'],
+            'recent_activity': dict(sorted(grouped['recent'].items())),
+            'collection_runs': sum(status_counts.values()),
+            'deduplication': {
+                'avg_seen_count': avg_seen or 0,
+                'max_seen_count': max_seen or 0
+            }
         }
-        
-        # Success/failure rates
-        cursor.execute("SELECT status, COUNT(*) FROM collection_logs GROUP BY status")
-        status_counts = dict(cursor.fetchall())
         stats['collection_success_rate'] = {
             'success': status_counts.get('success', 0),
             'error': status_counts.get('error', 0),
@@ -165,18 +314,43 @@ class CTIDatabase:
     
     def log_collection(self, source: str, stats: Dict[str, int], errors: str = None):
         """Log collection activity for thesis evaluation"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-        INSERT INTO collection_logs (source, collection_time, iocs_processed, iocs_new, iocs_updated, errors, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        self.log_collections([(source, stats, errors)])
+    
+    def log_collections(self, entries: List[Tuple[str, Dict[str, int], Optional[str]]]):
+        """Log several (source, stats, errors) collection entries with one commit"""
+        conn = self._get_conn()
+        with conn:
+            conn.executemany(_INSERT_LOG_SQL, [self._log_row(*entry) for entry in entries])
+        for source, stats, _ in entries:
+            self.logger.info(f"Logged collection: {source} - {stats}")
+    
+    def _log_row(self, source: str, stats: Dict[str, int], errors: Optional[str]) -> tuple:
+        """Build the collection_logs parameters for one entry"""
+        return (
             source, datetime.now().isoformat(), stats['processed'],
             stats['new'], stats['updated'], errors,
             'success' if not errors else 'error'
-        ))
-        self.conn.commit()
-        self.logger.info(f"Logged collection: {source} - {stats}")
+        )
+    
+    def incremental_vacuum(self, pages: int = 1000):
+        """Return up to `pages` free pages to the filesystem (no-op without incremental auto_vacuum)"""
+        # executescript steps the pragma to completion; execute() frees only one page
+        self._get_conn().executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    
+    def optimize(self):
+        """Refresh query planner statistics"""
+        conn = self._get_conn()
+        if self._has_planner_stats(conn):
+            conn.execute("PRAGMA optimize")
+        else:
+            conn.execute("ANALYZE")  # First run with data: optimize would skip unanalyzed tables
+        conn.commit()
     
     def close(self):
-        """Close database connection"""
-        self.conn.close()
+        """Close every thread's database connection"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.execute("PRAGMA optimize")
+            conn.close()
+        self._local = threading.local()
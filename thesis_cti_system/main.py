@@ -7,9 +7,12 @@ from database import CTIDatabase
 from api_ingestion import APIIngestion
 from normalization import IoCNormalizer
 from scheduler import CTIScheduler
-from config import Config
+from config import get_config
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 from pathlib import Path
 
 def setup_logging():
@@ -17,15 +20,26 @@ def setup_logging():
     # Create logs directory
     Path("logs").mkdir(exist_ok=True)
     
-    # Setup logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.FileHandler("logs/cti_collector.log"),
-            logging.StreamHandler()
-        ]
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    file_handler = logging.handlers.RotatingFileHandler(
+        "logs/cti_collector.log", maxBytes=10 * 1024 * 1024, backupCount=5, delay=True
     )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    
+    # Callers only enqueue records; formatting and writes happen on the listener thread
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    
+    # The queue handler must pass the bare message through; the listener's handlers format it
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
     return logging.getLogger(__name__)
 
 def main():
@@ -37,7 +51,7 @@ def main():
     logger.info("Starting CTI Collection System")
     
     # Initialize configuration
-    config = Config()
+    config = get_config()
     config.validate_config()
     
     # Initialize components
@@ -47,8 +61,8 @@ def main():
     scheduler = CTIScheduler(db, api_ingestion)
     
     # Update API keys from config
-    api_ingestion.api_keys['OTX'] = config.get_api_key('OTX')
-    api_ingestion.api_keys['AbuseIPDB'] = config.get_api_key('AbuseIPDB')
+    api_ingestion.update_api_key('OTX', config.get_api_key('OTX'))
+    api_ingestion.update_api_key('AbuseIPDB', config.get_api_key('AbuseIPDB'))
     
     # Start the complete system
     logger.info("Starting complete CTI collection system...")
@@ -4,107 +4,180 @@ Handles IoC type detection, validation, and normalization
 """
 
 import re
+import socket
 import ipaddress
 import logging
-from typing import Tuple, Optional
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Tuple, Optional, List
+
+# Regex patterns for validation
+HASH_PATTERNS = {
+    'md5': re.compile(r'^[a-fA-F0-9]{32}$'),
+    'sha1': re.compile(r'^[a-fA-F0-9]{40}$'),
+    'sha256': re.compile(r'^[a-fA-F0-9]{64}$')
+}
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Characters that can appear in a textual IPv4/IPv6 address
+_IP_CHARS = frozenset('0123456789abcdefABCDEF:.')
+
+# Feeds redeliver the same indicators every cycle; sized for the unique-IoC working set
+_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=8192)
+def _is_ip_address(value: str) -> bool:
+    """Check if a stripped value parses as an IPv4 or IPv6 address"""
+    # Most indicators contain other characters and are rejected without raising
+    if not value or not _IP_CHARS.issuperset(value):
+        return False
+    family = socket.AF_INET6 if ':' in value else socket.AF_INET
+    try:
+        socket.inet_pton(family, value)
+        return True
+    except OSError:
+        return False
+
+
+def is_ip(value: str) -> bool:
+    """Check if value is a valid IP address"""
+    return _is_ip_address(value.strip())
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def is_hash(value: str) -> bool:
+    """Check if value is a hash"""
+    value = value.strip()
+    for pattern in HASH_PATTERNS.values():
+        if pattern.match(value):
+            return True
+    return False
+
+
+def is_url(value: str) -> bool:
+    """Check if value is a URL"""
+    return value.strip().startswith(('http://', 'https://'))
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def is_domain(value: str) -> bool:
+    """Check if value is a domain"""
+    value = value.strip()
+    if is_url(value) or is_ip(value):
+        return False
+    return '.' in value and len(value) <= 253 and not value.startswith('.')
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def is_email(value: str) -> bool:
+    """Check if value is an email"""
+    return EMAIL_PATTERN.match(value.strip()) is not None
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def detect_type(value: str) -> str:
+    """Detect IoC type with priority order"""
+    if not value:
+        return "Unknown"
+    
+    # Priority order: IP, Hash, URL, Email, Domain
+    if is_ip(value):
+        return "IP"
+    if is_hash(value):
+        return "Hash"
+    if is_url(value):
+        return "URL"
+    if is_email(value):
+        return "Email"
+    if is_domain(value):
+        return "Domain"
+    
+    return "Unknown"
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _classify_and_normalize(indicator: str) -> Tuple[str, str]:
+    """Normalize an indicator and detect its type in one pass"""
+    # Same result as detect_type(normalize_indicator(indicator)), running each check once
+    indicator = indicator.strip()
+    
+    # URL normalization
+    if is_url(indicator):
+        return indicator.lower(), "URL"
+    
+    # Domain normalization; lowercasing can turn e.g. "HTTP://..." into a URL
+    if is_domain(indicator):
+        normalized = indicator.lower()
+        if is_url(normalized):
+            return normalized, "URL"
+        if is_email(normalized):
+            return normalized, "Email"
+        return normalized, "Domain"
+    
+    # Hash normalization
+    if is_hash(indicator):
+        return indicator.lower(), "Hash"
+    
+    # IP normalization
+    if is_ip(indicator):
+        try:
+            return str(ipaddress.ip_address(indicator)), "IP"
+        except ValueError:
+            return indicator, "IP"
+    
+    # Emails that fail the domain check (leading dot, over 253 characters)
+    if is_email(indicator):
+        return indicator, "Email"
+    
+    return indicator, "Unknown"
+
+
+def normalize_indicator(indicator: str) -> str:
+    """Normalize indicator based on type"""
+    return _classify_and_normalize(indicator)[0]
+
 
 class IoCNormalizer:
     """Handles IoC normalization and type detection"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        
-        # Regex patterns for validation
-        self.hash_patterns = {
-            'md5': re.compile(r'^[a-fA-F0-9]{32}$'),
-            'sha1': re.compile(r'^[a-fA-F0-9]{40}$'),
-            'sha256': re.compile(r'^[a-fA-F0-9]{64}$')
-        }
+        self.hash_patterns = HASH_PATTERNS
     
     def is_ip(self, value: str) -> bool:
         """Check if value is a valid IP address"""
-        try:
-            ipaddress.ip_address(value.strip())
-            return True
-        except ValueError:
-            return False
+        return is_ip(value)
     
     def is_hash(self, value: str) -> bool:
         """Check if value is a hash"""
-        value = value.strip()
-        for pattern in self.hash_patterns.values():
-            if pattern.match(value):
-                return True
-        return False
+        return is_hash(value)
     
     def is_url(self, value: str) -> bool:
         """Check if value is a URL"""
-        value = value.strip()
-        return value.startswith(('http://', 'https://'))
+        return is_url(value)
     
     def is_domain(self, value: str) -> bool:
         """Check if value is a domain"""
-        value = value.strip()
-        if self.is_url(value) or self.is_ip(value):
-            return False
-        return '.' in value and len(value) <= 253 and not value.startswith('.')
+        return is_domain(value)
     
     def is_email(self, value: str) -> bool:
         """Check if value is an email"""
-        value = value.strip()
-        email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-        return email_pattern.match(value) is not None
+        return is_email(value)
     
     def detect_type(self, value: str) -> str:
         """Detect IoC type with priority order"""
-        if not value:
-            return "Unknown"
-        
-        # Priority order: IP, Hash, URL, Email, Domain
-        if self.is_ip(value):
-            return "IP"
-        if self.is_hash(value):
-            return "Hash"
-        if self.is_url(value):
-            return "URL"
-        if self.is_email(value):
-            return "Email"
-        if self.is_domain(value):
-            return "Domain"
-        
-        return "Unknown"
+        return detect_type(value)
     
     def normalize_indicator(self, indicator: str) -> str:
         """Normalize indicator based on type"""
-        indicator = indicator.strip()
-        
-        # URL normalization
-        if self.is_url(indicator):
-            return indicator.lower()
-        
-        # Domain normalization
-        if self.is_domain(indicator):
-            return indicator.lower()
-        
-        # Hash normalization
-        if self.is_hash(indicator):
-            return indicator.lower()
-        
-        # IP normalization
-        if self.is_ip(indicator):
-            try:
-                return str(ipaddress.ip_address(indicator))
-            except ValueError:
-                return indicator
-        
-        return indicator
+        return normalize_indicator(indicator)
     
     def normalize_ioc(self, raw_indicator: str, source: str, 
                      confidence: str = "medium", threat_level: str = "medium",
-                     metadata: dict = None) -> dict:
+                     metadata: dict = None, date_collected: str = None) -> dict:
         """Normalize a complete IoC"""
-        normalized_indicator = self.normalize_indicator(raw_indicator)
-        ioc_type = self.detect_type(normalized_indicator)
+        normalized_indicator, ioc_type = _classify_and_normalize(raw_indicator)
         
         return {
             'indicator': normalized_indicator,
@@ -113,13 +186,25 @@ class IoCNormalizer:
             'confidence': confidence,
             'threat_level': threat_level,
             'metadata': metadata or {},
-            'date_collected': self._get_timestamp()
+            'date_collected': date_collected or self.get_timestamp()
         }
     
-    def _get_timestamp(self) -> str:
+    def normalize_iocs_batch(self, raw_indicators: List[str], source: str,
+                             confidence: str = "medium", threat_level: str = "medium",
+                             metadata: List[dict] = None) -> List[dict]:
+        """Normalize IoCs harvested in one poll, sharing a single collection timestamp"""
+        date_collected = self.get_timestamp()
+        if metadata is None:
+            metadata = [None] * len(raw_indicators)
+        return [
+            self.normalize_ioc(raw, source, confidence, threat_level, meta, date_collected)
+            for raw, meta in zip(raw_indicators, metadata)
+        ]
+    
+    def get_timestamp(self) -> str:
         """Get current timestamp"""
-        from datetime import datetime
-        return datetime.utcnow().isoformat()
+        # Naive UTC, in the same format utcnow() produced for the stored rows
+        return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
     
     def validate_ioc(self, ioc: dict) -> bool:
         """Validate IoC structure"""
@@ -7,6 +7,7 @@ import schedule
 import time
 import logging
 from typing import Dict, Any
+from config import get_config
 
 class CTIScheduler:
     """Handles scheduling and orchestration of collection tasks"""
@@ -15,73 +16,36 @@ class CTIScheduler:
         self.db = db
         self.api_ingestion = api_ingestion
         self.logger = logging.getLogger(__name__)
+        self.config = get_config()
         
         # Schedule configuration
-        self.collection_interval = 6  # hours
+        self.collection_interval = self.config.COLLECTION_INTERVAL_HOURS
         self.is_running = False
     
     def run_collection(self) -> Dict[str, Any]:
         """Run a complete collection job with full orchestration"""
         self.logger.info("Starting CTI collection job...")
         
-        # Collect from all sources with individual error handling
+        # Collect from all sources concurrently; each fetch logs and absorbs its own errors
         all_iocs = []
         collection_errors = []
         
-        # Collect from OTX
         try:
-            from config import Config
-            config = Config()
-            
-            otx_total = 0
-            for domain in config.THREAT_DOMAINS:
-                try:
-                    otx_iocs = self.api_ingestion.fetch_otx(domain)
-                    all_iocs.extend(otx_iocs)
-                    otx_total += len(otx_iocs)
-                    self.logger.info(f"OTX: Collected {len(otx_iocs)} URLs from {domain}")
-                except Exception as e:
-                    error_msg = f"OTX collection failed for {domain}: {e}"
-                    collection_errors.append(error_msg)
-                    self.logger.error(error_msg)
-            
-            self.logger.info(f"OTX: Total collected {otx_total} IoCs from {len(config.THREAT_DOMAINS)} domains")
+            all_iocs = self.api_ingestion.fetch_all(
+                self.config.THREAT_DOMAINS,
+                abuseipdb_limit=self.config.ABUSEIPDB_LIMIT,
+                malwarebazaar_limit=self.config.MALWAREBAZAAR_LIMIT
+            )
         except Exception as e:
-            error_msg = f"OTX collection failed: {e}"
-            collection_errors.append(error_msg)
-            self.logger.error(error_msg)
-        
-        # Collect from AbuseIPDB
-        try:
-            from config import Config
-            config = Config()
-            
-            abuse_iocs = self.api_ingestion.fetch_abuseipdb(limit=config.ABUSEIPDB_LIMIT)
-            all_iocs.extend(abuse_iocs)
-            self.logger.info(f"AbuseIPDB: Collected {len(abuse_iocs)} IPs from blacklist")
-        except Exception as e:
-            error_msg = f"AbuseIPDB collection failed: {e}"
-            collection_errors.append(error_msg)
-            self.logger.error(error_msg)
-        
-        # Collect from MalwareBazaar - Using export feed (no API blocks)
-        try:
-            from config import Config
-            config = Config()
-            
-            mb_iocs = self.api_ingestion.fetch_malwarebazaar(limit=config.MALWAREBazaar_LIMIT)
-            all_iocs.extend(mb_iocs)
-            self.logger.info(f"MalwareBazaar: Collected {len(mb_iocs)} hashes (limit: {config.MALWAREBazaar_LIMIT})")
-        except Exception as e:
-            error_msg = f"MalwareBazaar collection failed: {e}"
+            error_msg = f"Collection failed: {e}"
             collection_errors.append(error_msg)
             self.logger.error(error_msg)
         
         # Process collected IoCs
         if all_iocs:
-            stats = self.db.insert_or_update_iocs(all_iocs)
+            # The IoCs and the run's log entry are committed together
             error_summary = "; ".join(collection_errors) if collection_errors else None
-            self.db.log_collection("CTI_Collector", stats, error_summary)
+            stats = self.db.record_collection(all_iocs, "CTI_Collector", error_summary)
             
             self.logger.info(f"Collection completed: {stats}")
             print(f"Collection Stats: {stats}")
@@ -103,12 +67,22 @@ class CTIScheduler:
                 'total_collected': 0
             }
     
+    def run_maintenance(self):
+        """Reclaim free database pages and refresh planner statistics"""
+        try:
+            self.db.incremental_vacuum(1000)
+            self.db.optimize()
+            self.logger.info("Database maintenance completed")
+        except Exception as e:
+            self.logger.error(f"Database maintenance failed: {e}")
+    
     def start_scheduling(self):
         """Start the scheduled collection tasks with daily schedule"""
         self.logger.info("Scheduling daily collection at 09:00")
         
-        # Schedule daily collection
+        # Schedule daily collection, followed by database maintenance
         schedule.every().day.at("09:00").do(self.run_collection)
+        schedule.every().day.at("09:30").do(self.run_maintenance)
         
         # Run initial collection
         print("Running initial collection...")
@@ -126,9 +100,14 @@ class CTIScheduler:
         print("Press Ctrl+C to stop...")
         
         try:
+            # Sleep until the next job is due (capped at an hour) instead of polling
             while self.is_running:
+                idle = schedule.idle_seconds()
+                if idle is None:
+                    break  # No jobs left
+                if idle > 0:
+                    time.sleep(min(idle, 3600))
                 schedule.run_pending()
-                time.sleep(60)  # Check every minute
         except KeyboardInterrupt:
             print("\nShutting down collector...")
             self.logger.info("Scheduler stopped by user")